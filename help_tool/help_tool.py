@@ -8,13 +8,13 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
-import statsmodels.api as sm
+from joblib import Parallel, delayed
 from scipy import stats
-from sklearn.metrics import (accuracy_score, auc, confusion_matrix, roc_curve)
+from sklearn.base import clone
+from sklearn.metrics import (accuracy_score, auc, roc_curve)
 from sklearn.model_selection import KFold
 from unidecode import unidecode
 import textblob
-from sklearn.metrics import matthews_corrcoef
 from sklearn.metrics import precision_score, recall_score, f1_score, roc_auc_score
 pd.plotting.register_matplotlib_converters()
 
@@ -23,9 +23,15 @@ alpha = 0.05  # Significance level
 confidence_level = 0.95
 
 
-def csv_download(path: str) -> pd.DataFrame:
-    """Download data and capitalize the column names."""
-    df = pd.read_csv(path, index_col=False, header=0)
+def csv_download(path: str, usecols: Optional[list] = None) -> pd.DataFrame:
+    """Download data and capitalize the column names.
+
+    Parsed with the multithreaded PyArrow engine when pyarrow is installed,
+    otherwise with the default C engine."""
+    try:
+        df = pd.read_csv(path, header=0, usecols=usecols, engine='pyarrow')
+    except ImportError:
+        df = pd.read_csv(path, index_col=False, header=0, usecols=usecols)
     df.columns = df.columns.str.capitalize()
     return df
 
@@ -33,63 +39,83 @@ def csv_download(path: str) -> pd.DataFrame:
 def first_look(df: pd.DataFrame) -> None:
     """Performs initial data set analysis."""
 
+    # Null check in one pass over the values, duplicates compared as 64-bit row hashes
+    na_any = df.isna().to_numpy().any(axis=0)
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    duplicates = int(pd.Series(row_hashes).duplicated().sum())
+
     print(f'Column data types:\n{df.dtypes}\n')
     print(f'Dataset has {df.shape[0]} observations and {df.shape[1]} features')
-    print(f'Columns with NULL values: {df.columns[df.isna().any()].tolist()}')
-    print(f'Dataset has {df.duplicated().sum()} duplicates')
+    print(f'Columns with NULL values: {df.columns[na_any].tolist()}')
+    print(f'Dataset has {duplicates} duplicates')
 
 
 def dummy_columns(df, feature_list):
     """ Created a dummy and replaces the old feature with the new dummy """
-    df_dummies = pd.get_dummies(df[feature_list])
-    df_dummies = df_dummies.astype(int)
-
-    df = pd.concat([df, df_dummies], axis=1)
-    df.drop(columns=feature_list, inplace=True)
+    df_dummies = pd.get_dummies(df[feature_list], dtype=np.int8)
 
     # Drop '_No' features and leave '_Yes'
     # Replace the original column with new dummy
-    df = df.drop(columns=[col for col in df.columns if col.endswith('_No')])
-    df.columns = [col.replace('_Yes', '') for col in df.columns]
+    df_dummies = df_dummies[[col for col in df_dummies.columns
+                             if not col.endswith('_No')]]
+    df_dummies.columns = [col[:-len('_Yes')] if col.endswith('_Yes') else col
+                          for col in df_dummies.columns]
+
+    df = df.drop(columns=feature_list)
+    df[list(df_dummies.columns)] = df_dummies.to_numpy()
     return df
 
 
 def distribution_check(df: pd.DataFrame) -> None:
     """Box plot graph for identifying numeric column outliers, normality of distribution."""
-    sample_size = 1000
+    numeric = df.select_dtypes(include=np.number)
+    mins = numeric.min().to_dict()
+    maxs = numeric.max().to_dict()
 
-    for feature in df.columns:
-
-        if df[feature].dtype == 'object':
-            pass
-
-        else:
+    for feature, col in numeric.items():
 
-            fig, axes = plt.subplots(1, 3, figsize=(12, 3))
+        fig, axes = plt.subplots(1, 3, figsize=(12, 3))
 
-            print(f'{feature}')
+        print(f'{feature}')
 
-            # Outlier check (Box plot)
-            df.boxplot(column=feature, ax=axes[0])
-            axes[0].set_title(
-                f'{feature} ranges from {df[feature].min()} to {df[feature].max()}')
+        # Outlier check (Box plot)
+        col.to_frame().boxplot(ax=axes[0])
+        axes[0].set_title(
+            f'{feature} ranges from {mins[feature]} to {maxs[feature]}')
 
-            # Distribution check (Histogram).
-            sns.histplot(data=df, x=feature, kde=True, bins=20, ax=axes[1])
-            axes[1].set_title(f'Distribution of {feature}')
+        # Distribution check (Histogram).
+        sns.histplot(x=col, kde=True, bins=20, ax=axes[1])
+        axes[1].set_title(f'Distribution of {feature}')
 
-            # Normality check (QQ plot).
-            sm.qqplot(df[feature].dropna(), line='s', ax=axes[2])
-            axes[2].set_title(f'Q-Q plot of {feature}')
+        # Normality check (QQ plot with a standardized line).
+        values = col.dropna().to_numpy()
+        osm, osr = stats.probplot(values, dist='norm', fit=False)
+        axes[2].scatter(osm, osr, s=10)
+        axes[2].plot(osm, osm * values.std() + values.mean(), 'r')
+        axes[2].set_xlabel('Theoretical Quantiles')
+        axes[2].set_ylabel('Sample Quantiles')
+        axes[2].set_title(f'Q-Q plot of {feature}')
 
-            plt.tight_layout()
-            plt.show()
+        plt.tight_layout()
+        plt.show()
 
 
 def heatmap(df: pd.DataFrame, name: str, method: str) -> None:
     """ Plotting the heatmap """
+    numeric = df.select_dtypes(include=[np.number, 'bool'])
+
+    if method in ('pearson', 'spearman') and not numeric.isna().to_numpy().any():
+        # NumPy (BLAS) correlation, pandas is kept for kendall and missing values
+        arr = numeric.to_numpy(dtype=np.float64, copy=False)
+        if method == 'spearman':
+            arr = stats.rankdata(arr, axis=0)
+        corr = pd.DataFrame(np.corrcoef(arr, rowvar=False),
+                            index=numeric.columns, columns=numeric.columns)
+    else:
+        corr = numeric.corr(method=method)
+
     plt.figure(figsize=(8, 5))
-    sns.heatmap(df.corr(method=method), annot=True,
+    sns.heatmap(corr, annot=True,
                 cmap='coolwarm', fmt='.2f', vmin=-1, vmax=1)
     plt.title(f'Correlation {name.capitalize()} Attributes')
     plt.show()
@@ -121,17 +147,18 @@ def countplot_per_feature(df, feature_list):
 
 def phi_corr_matrix(df, feature_list):
     """ Phi correlation for binary features"""
-    phi_corr_matrix = pd.DataFrame(index=feature_list, columns=feature_list)
-
-    for feature1 in feature_list:
-        for feature2 in feature_list:
-            phi_corr_matrix.loc[feature1, feature2] = matthews_corrcoef(
-                df[feature1], df[feature2])
-
-    thresholded_matrix = phi_corr_matrix[(
-        phi_corr_matrix <= (-1) * alpha) | (phi_corr_matrix >= alpha)]
-
-    sns.heatmap(thresholded_matrix.astype(float),
+    # Phi coefficient of two binary features is the Pearson correlation of 0/1 columns
+    binary_matrix = df[feature_list].to_numpy(dtype=np.float32)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        phi = np.corrcoef(binary_matrix, rowvar=False)
+    # Constant columns have no correlation (same as matthews_corrcoef)
+    phi = np.nan_to_num(phi, nan=0.0)
+
+    # Cells below the threshold are left blank
+    significant = np.abs(phi) >= alpha
+    phi_matrix = pd.DataFrame(phi, index=feature_list, columns=feature_list)
+
+    sns.heatmap(phi_matrix, mask=~significant,
                 annot=True, annot_kws={"size": 8}, cmap='rocket', fmt=".2f")
     plt.title(
         f'Phi correlation coefficient of Binary Attributes (Thresholds +/- {alpha})')
@@ -143,15 +170,27 @@ def significance_t_test(df: pd.DataFrame, feature: str, change_feature: str,
                         min_change_value: float, max_change_value: float) -> None:
     """Perform a t-test (sample size is small or when 
     the population standard deviation is unknown) and follows a normal distribution."""
-    t_stat, p_value = stats.ttest_ind(df[df[change_feature] == min_change_value][feature],
-                                      df[df[change_feature] == max_change_value][feature], equal_var=False)
+    significance_sweep(df, [feature], change_feature,
+                       min_change_value, max_change_value)
 
-    if p_value < alpha:
-        print(
-            f'p-value = {p_value:.4f} between {feature} and {change_feature}. Reject null hypothesis')
-    else:
-        print(
-            f'p-value = {p_value:.4f} between {feature} and {change_feature}. Fail to reject null hypothesis')
+
+def significance_sweep(df: pd.DataFrame, features: list, change_feature: str,
+                       min_change_value: float, max_change_value: float) -> None:
+    """T-test of many features between two groups of change_feature,
+    splitting the rows into groups once for all features."""
+    groups = {value: group.to_numpy(dtype=np.float64)
+              for value, group in df.groupby(change_feature)[features]}
+
+    _, p_values = stats.ttest_ind(groups[min_change_value], groups[max_change_value],
+                                  axis=0, equal_var=False)
+
+    for feature, p_value in zip(features, np.atleast_1d(p_values)):
+        if p_value < alpha:
+            print(
+                f'p-value = {p_value:.4f} between {feature} and {change_feature}. Reject null hypothesis')
+        else:
+            print(
+                f'p-value = {p_value:.4f} between {feature} and {change_feature}. Fail to reject null hypothesis')
 
 
 
@@ -185,40 +224,53 @@ def confidence_intervals(data, type) -> None:
 
 def f2_score(y_true, y_pred, beta=2):
     """ F2 score """
-    precision = precision_score(y_true, y_pred)
-    recall = recall_score(y_true, y_pred)
+    _, precision, recall, _ = _binary_metrics(_confusion_2x2(y_true, y_pred))
+    if precision + recall == 0:
+        return 0.0
     f2 = (1 + beta**2) * (precision * recall) / \
         ((beta**2 * precision) + recall)
     return f2
 
 
-def model_selection_f1(model, X_train, y_train, X_validation, y_validation):
-    """Model Accuracy Score for test and validation data"""
+def _scores(model, X):
+    """Raw model scores: decision function if available, else positive class probability"""
+    if hasattr(model, 'decision_function'):
+        return model.decision_function(X)
+    # Copy the strided column out of the (n, 2) array so scipy/sklearn get a contiguous vector
+    return np.ascontiguousarray(model.predict_proba(X)[:, 1])
 
-    n = 2
 
-    train_recall = f1_score(model.predict(X_train), y_train)
-    validation_recall = f1_score(model.predict(X_validation), y_validation)
+def precompute_scores(models, labels, X):
+    """ Score every model on X once, for reuse across the plotting and metric helpers"""
+    return {label: _scores(model, X) for model, label in zip(models, labels)}
 
-    if hasattr(model, 'decision_function'):
-        y_prob = model.decision_function(X_validation)
-    else:
-        y_prob = model.predict_proba(X_validation)[:, 1]
+
+def model_selection_f1(model, X_validation, y_validation, *, X_train=None, y_train=None):
+    """Model Accuracy Score for test and validation data.
+    Train F1 is skipped when X_train is not given."""
+
+    n = 2
+
+    # One inference on validation data serves both F1 and ROC AUC
+    y_prob = _scores(model, X_validation)
+    decision_boundary = 0 if hasattr(model, 'decision_function') else 0.5
+    validation_recall = f1_score(
+        (y_prob > decision_boundary).astype(int), y_validation)
 
     fpr, tpr, _ = roc_curve(y_validation, y_prob)
     roc_auc = auc(fpr, tpr)
 
-    print(f"Train F1: {train_recall:.{n}%}")
+    if X_train is not None:
+        train_recall = f1_score(model.predict(X_train), y_train)
+        print(f"Train F1: {train_recall:.{n}%}")
     print(f"Validation F1: {validation_recall:.{n}%}")
     print(f"ROC AUC: {roc_auc:.2f}")
 
 
-def plot_roc_curve(model, X_train_scaled, y_train, label):
+def plot_roc_curve(model, X_train_scaled, y_train, label, y_prob=None):
     """ ROC Curve plot"""
-    if hasattr(model, 'decision_function'):
-        y_prob = model.decision_function(X_train_scaled)
-    else:
-        y_prob = model.predict_proba(X_train_scaled)[:, 1]
+    if y_prob is None:
+        y_prob = _scores(model, X_train_scaled)
 
     fpr, tpr, thresholds = roc_curve(y_train, y_prob)
     roc_auc = auc(fpr, tpr)
@@ -226,11 +278,14 @@ def plot_roc_curve(model, X_train_scaled, y_train, label):
     plt.plot(fpr, tpr, lw=2, label=f'{label} (AUC = {roc_auc:.2f})')
 
 
-def plot_roc_curve_many(models, labels, X_test, y_test):
+def plot_roc_curve_many(models, labels, X_test, y_test, scores_cache=None):
     """ Put many  ROC Curve plots into 1 gragh"""
+    if scores_cache is None:
+        scores_cache = {}
 
     for model, label in zip(models, labels):
-        plot_roc_curve(model, X_test, y_test, label)
+        plot_roc_curve(model, X_test, y_test, label,
+                       y_prob=scores_cache.get(label))
 
     plt.plot([0, 1], [0, 1], color='navy', lw=2,
              linestyle='--', label='Random Guessing')
@@ -250,26 +305,36 @@ def feature_transpose(df, feature_list):
     thresholds.columns = thresholds.iloc[0]
     thresholds.drop(thresholds.index[0], inplace=True)
 
-    return thresholds
+    # Transposing mixed columns leaves object dtype, restore numeric columns
+    return thresholds.infer_objects()
 
 
-def roc_many_curves(models, model_name, thresholds_df, X, y):
+def optimal_thresholds(thresholds_df, labels) -> dict:
+    """ Look up each model's optimal threshold once as a plain float"""
+    return {label: float(thresholds_df[label].iloc[0]) for label in labels}
+
+
+def roc_many_curves(models, model_name, thresholds_df, X, y, scores_cache=None):
     """ Many ROC curves"""
-    for model, label in zip(models, model_name):
-        """ ROC Curve plot"""
-        if hasattr(model, 'decision_function'):
-            predictions = model.decision_function(X)
-        else:
-            predictions = model.predict_proba(X)[:, 1]
+    if scores_cache is None:
+        scores_cache = precompute_scores(models, model_name, X)
+    thresholds = optimal_thresholds(thresholds_df, model_name)
+    positives = np.asarray(y) == 1
 
-        # Adjust decision threshold using the optimal threshold
-        optimal_threshold = thresholds_df[label].iloc[0]
-        adjusted_predictions = (predictions > optimal_threshold).astype(int)
+    for label in model_name:
+        """ ROC Curve plot"""
+        predictions = scores_cache[label]
 
-        fpr, tpr, thresholds = roc_curve(y, adjusted_predictions)
+        fpr, tpr, _ = roc_curve(y, predictions)
         roc_auc = auc(fpr, tpr)
 
-        plt.plot(fpr, tpr, lw=2, label=f'{label} (AUC = {roc_auc:.2f})')
+        line, = plt.plot(fpr, tpr, lw=2, label=f'{label} (AUC = {roc_auc:.2f})')
+
+        # Mark the operating point of the optimal threshold
+        adjusted_predictions = predictions > thresholds[label]
+        plt.plot(adjusted_predictions[~positives].mean(),
+                 adjusted_predictions[positives].mean(),
+                 marker='o', color=line.get_color())
 
     plt.plot([0, 1], [0, 1], color='navy', lw=2,
              linestyle='--', label='Random Guessing')
@@ -280,58 +345,74 @@ def roc_many_curves(models, model_name, thresholds_df, X, y):
     plt.show()
 
 
-def cross_val_thresholds(fold, X, y, thresholds_df, classifiers):
-    """ Cross validation with threshold adjustments """
-    kf = KFold(n_splits=fold)
-    # Initialize lists to store metric scores and confusion matrices
-    metric_scores = {metric: {clf_name: [] for clf_name in classifiers.keys(
-    )} for metric in ['accuracy', 'precision', 'recall', 'f1']}
-    confusion_matrices = {clf_name: np.zeros(
-        (2, 2)) for clf_name in classifiers.keys()}
+def _confusion_2x2(y_true, y_pred) -> np.ndarray:
+    """Binary confusion matrix [[TN, FP], [FN, TP]] from a single bincount pass."""
+    y_true = np.asarray(y_true, dtype=np.int8)
+    y_pred = np.asarray(y_pred, dtype=np.int8)
+    return np.bincount(2 * y_true + y_pred, minlength=4).reshape(2, 2)
 
-    for train_index, val_index in kf.split(X):
-        X_train_i, X_val = X.iloc[train_index], X.iloc[val_index]
-        y_train_i, y_val = y.iloc[train_index], y.iloc[val_index]
 
-        for clf_name, clf in classifiers.items():
-            clf.fit(X_train_i, y_train_i)
+def _binary_metrics(cm: np.ndarray) -> tuple:
+    """Accuracy, precision, recall and F1 of a 2x2 confusion matrix (0 when undefined)."""
+    (tn, fp), (fn, tp) = cm
+    accuracy = (tp + tn) / cm.sum()
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return accuracy, precision, recall, f1
 
-            # Threshold update
-            # Assuming binary classification
-            scores = clf.predict_proba(X_val)[:, 1]
-            optimal_threshold = thresholds_df[clf_name].iloc[0]
-            y_pred = (scores > optimal_threshold).astype(int)
 
-            # Calculate metrics
-            metric_scores['accuracy'][clf_name].append(
-                accuracy_score(y_val, y_pred))
-            metric_scores['precision'][clf_name].append(
-                precision_score(y_val, y_pred))
-            metric_scores['recall'][clf_name].append(
-                recall_score(y_val, y_pred))
-            metric_scores['f1'][clf_name].append(f1_score(y_val, y_pred))
+def _fit_one(clf_name, clf, X_train, y_train, X_val, y_val, optimal_threshold):
+    """ Fit one classifier on one fold and score it at its optimal threshold """
+    clf.fit(X_train, y_train)
 
-            # Compute confusion matrix
-            cm = confusion_matrix(y_val, y_pred)
-            confusion_matrices[clf_name] += cm
+    # Threshold update
+    # Assuming binary classification
+    scores = clf.predict_proba(X_val)[:, 1]
+    y_pred = (scores > optimal_threshold).astype(np.int8)
 
-    # Calculate average scores
-    avg_metric_scores = {metric: {clf_name: np.mean(scores) for clf_name, scores in clf_scores.items(
-    )} for metric, clf_scores in metric_scores.items()}
+    # Confusion matrix and every metric from one pass over the fold
+    cm = _confusion_2x2(y_val, y_pred)
+    return clf_name, _binary_metrics(cm), cm
 
-    # Average confusion matrices
-    avg_confusion_matrices = {
-        clf_name: matrix / fold for clf_name, matrix in confusion_matrices.items()}
 
+def cross_val_thresholds(fold, X, y, thresholds_df, classifiers, n_jobs=-1):
+    """ Cross validation with threshold adjustments.
+    Each fold fits a clone, so the given classifiers are left unfitted. Lower n_jobs
+    for models that are multithreaded themselves (XGBoost, RandomForest n_jobs) """
+    kf = KFold(n_splits=fold)
+    # Initialize lists to store metric scores and confusion matrices
+    metric_scores = {metric: {clf_name: [] for clf_name in classifiers.keys(
+    )} for metric in ['accuracy', 'precision', 'recall', 'f1']}
+    confusion_matrices = {clf_name: np.zeros(
+        (2, 2)) for clf_name in classifiers.keys()}
+    thresholds = optimal_thresholds(thresholds_df, classifiers.keys())
+
+    # Every (fold, classifier) fit is independent, run them in parallel
+    tasks = (
+        delayed(_fit_one)(clf_name, clone(clf),
+                          X.iloc[train_index], y.iloc[train_index],
+                          X.iloc[val_index], np.asarray(
+                              y.iloc[val_index], dtype=np.int8),
+                          thresholds[clf_name])
+        for train_index, val_index in kf.split(X)
+        for clf_name, clf in classifiers.items())
+
+    for clf_name, metrics, cm in Parallel(n_jobs=n_jobs)(tasks):
+        for metric, score in zip(['accuracy', 'precision', 'recall', 'f1'], metrics):
+            metric_scores[metric][clf_name].append(score)
+        confusion_matrices[clf_name] += cm
+
+    # Average scores and confusion matrices over the folds
     cv_results = []
-    for clf_name, scores in avg_metric_scores['accuracy'].items():
+    for clf_name, clf in classifiers.items():
         cv_results.append({
-            'Classifier': classifiers[clf_name].__class__.__name__,
-            'CV Mean Accuracy': np.mean(scores),
-            'CV Mean Precision': np.mean(avg_metric_scores['precision'][clf_name]),
-            'CV Mean Recall': np.mean(avg_metric_scores['recall'][clf_name]),
-            'CV Mean F1': np.mean(avg_metric_scores['f1'][clf_name]),
-            'Confusion Matrix': avg_confusion_matrices[clf_name]
+            'Classifier': clf.__class__.__name__,
+            'CV Mean Accuracy': float(np.mean(metric_scores['accuracy'][clf_name])),
+            'CV Mean Precision': float(np.mean(metric_scores['precision'][clf_name])),
+            'CV Mean Recall': float(np.mean(metric_scores['recall'][clf_name])),
+            'CV Mean F1': float(np.mean(metric_scores['f1'][clf_name])),
+            'Confusion Matrix': confusion_matrices[clf_name] / fold
         })
 
     model_info = pd.DataFrame(cv_results)
@@ -365,33 +446,33 @@ def cross_validation_confusion_matrix(model_info):
     plt.show()
 
 
-def f1_score_test(models, model_names, thresholds_df, X, y):
+def f1_score_test(models, model_names, thresholds_df, X, y, scores_cache=None):
     """ Calculate F1 scores for multiple models"""
+    if scores_cache is None:
+        scores_cache = precompute_scores(models, model_names, X)
+    thresholds = optimal_thresholds(thresholds_df, model_names)
 
-    for model, label in zip(models, model_names):
-        if hasattr(model, 'decision_function'):
-            predictions = model.decision_function(X)
-        else:
-            predictions = model.predict_proba(X)[:, 1]
+    for label in model_names:
+        predictions = scores_cache[label]
 
-        optimal_threshold = thresholds_df[label].iloc[0]
+        optimal_threshold = thresholds[label]
         adjusted_predictions = (predictions > optimal_threshold).astype(int)
 
         f1 = f1_score(y, adjusted_predictions)
         print(f"{label}: {f1:.2f}")
 
 
-def model_score_test(models, model_names, thresholds_df, X, y):
+def model_score_test(models, model_names, thresholds_df, X, y, scores_cache=None):
     """ Calculate various scores for multiple models"""
+    if scores_cache is None:
+        scores_cache = precompute_scores(models, model_names, X)
+    thresholds = optimal_thresholds(thresholds_df, model_names)
 
     data = []
-    for model, label in zip(models, model_names):
-        if hasattr(model, 'decision_function'):
-            predictions = model.decision_function(X)
-        else:
-            predictions = model.predict_proba(X)[:, 1]
+    for label in model_names:
+        predictions = scores_cache[label]
 
-        optimal_threshold = thresholds_df[label].iloc[0]
+        optimal_threshold = thresholds[label]
         adjusted_predictions = (predictions > optimal_threshold).astype(int)
 
         f1 = f1_score(y, adjusted_predictions)
@@ -1,38 +1,258 @@
+import asyncio
+import os
+import re
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Annotated
+
+# One BLAS/OpenMP thread per worker process, set before NumPy is imported.
+# Concurrency comes from uvicorn workers (see Dockerfile).
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+
 from pydantic import BaseModel
-from fastapi import FastAPI
-import pandas as pd
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+import msgspec
+from msgspec.structs import astuple
+import numpy as np
 import joblib
+import sklearn
 #from sklearn.naive_bayes import GaussianNB
 
+# 0/1 indicator feature
+Binary = Annotated[int, msgspec.Meta(ge=0, le=1)]
+
+
 # Expected input
-class Stroke_Event(BaseModel):
+class Stroke_Event(msgspec.Struct):
     Age: float
-    Hypertension: int
-    Heart_disease: int
+    Hypertension: Binary
+    Heart_disease: Binary
     Avg_glucose_level: float
     Bmi: float 
-    Gender_Female: int
-    Ever_married: int
-    Residence_Urban: int
-    Smoking_status_was_missing: int
-    Bmi_was_missing: int
-    Work_type_Govt_job: int
-    Work_type_Private: int
-    Work_type_Self_employed: int
-    Smoking_status_formerly_smoked: int
-    Smoking_status_never_smoked: int
-    Smoking_status_smokes: int
+    Gender_Female: Binary
+    Ever_married: Binary
+    Residence_Urban: Binary
+    Smoking_status_was_missing: Binary
+    Bmi_was_missing: Binary
+    Work_type_Govt_job: Binary
+    Work_type_Private: Binary
+    Work_type_Self_employed: Binary
+    Smoking_status_formerly_smoked: Binary
+    Smoking_status_never_smoked: Binary
+    Smoking_status_smokes: Binary
+
+
+# Model input column order (same order as the training data). It is the struct's
+# field order, so astuple(event) is the model input row.
+FEATURE_ORDER = Stroke_Event.__struct_fields__
+
+# Request bodies are decoded straight into Stroke_Event by msgspec
+# (strict=False also accepts numeric strings such as "1", as Pydantic did)
+event_decoder = msgspec.json.Decoder(Stroke_Event, strict=False)
+batch_decoder = msgspec.json.Decoder(list[Stroke_Event], strict=False)
+EVENT_SCHEMA = msgspec.json.schema(Stroke_Event)["$defs"]["Stroke_Event"]
+
+
+def validation_error(exc: msgspec.DecodeError) -> RequestValidationError:
+    """FastAPI's usual 422 error body for a request msgspec rejected."""
+    msg, _, path = str(exc).partition(" - at `$")
+    loc = [int(part) if part.isdigit() else part
+           for part in re.split(r"[.\[\]`]", path) if part]
+    error_type = "value_error" if isinstance(exc, msgspec.ValidationError) else "json_invalid"
+    return RequestValidationError([{"type": error_type, "loc": ["body", *loc], "msg": msg}])
+
+
+def non_finite_error(X) -> RequestValidationError:
+    """422 error for the first NaN or infinite feature of a row or batch.
+    strict=False decodes "nan", "inf" and "-inf" strings as floats."""
+    index = np.argwhere(~np.isfinite(X))[0].tolist()
+    index[-1] = FEATURE_ORDER[index[-1]]
+    return RequestValidationError([{"type": "finite_number", "loc": ["body", *index],
+                                    "msg": "Input should be a finite number"}])
 
 
 # Expected output
 class PredictionOut(BaseModel):
-    default_proba: float
+    default_proba: int
+
+
+class PredictionBatchOut(BaseModel):
+    default_proba: list[int]
 
 
+# The output is a 0/1 flag, so each of the two response bodies is encoded only once
+@lru_cache(maxsize=2)
+def prediction_body(flag: int) -> bytes:
+    return PredictionOut(default_proba=flag).model_dump_json().encode()
+
+
+# Optimal decision threshold of the Naive Bayes model (Model.ipynb)
+THRESHOLD = 0.545455
+# The same threshold on the log odds scale (the sigmoid is monotonic)
+THRESHOLD_LOGIT = float(np.log(THRESHOLD / (1 - THRESHOLD)))
+
 #model = GaussianNB(var_smoothing=1e-09)
-model = joblib.load("model.pkl")
+# Memory-map the model arrays so worker processes share them through the page cache
+# (model.pkl is saved uncompressed by joblib.dump in Model.ipynb)
+model = joblib.load("model.pkl", mmap_mode="r")
+# Inputs are raw arrays in FEATURE_ORDER: check once that it is the training
+# column order, then drop the stored names so sklearn skips its per-call check
+if hasattr(model, "feature_names_in_"):
+    if tuple(model.feature_names_in_) != FEATURE_ORDER:
+        raise RuntimeError(
+            f"Stroke_Event fields {FEATURE_ORDER} do not match the model's "
+            f"training columns {tuple(model.feature_names_in_)}")
+    if "feature_names_in_" in vars(model):
+        del model.feature_names_in_
+
+
+def log_odds_params(model):
+    """(linear, quadratic, intercept) with log odds = X @ linear + (X * X) @ quadratic
+    + intercept for two-class GaussianNB/LogisticRegression, else None."""
+    name = type(model).__name__
+    if len(getattr(model, 'classes_', ())) != 2:
+        return None
+
+    if name == 'GaussianNB':
+        (theta0, theta1), (var0, var1) = model.theta_, model.var_
+        const = np.log(model.class_prior_) - 0.5 * np.log(2.0 * np.pi * model.var_).sum(axis=1)
+        linear = theta1 / var1 - theta0 / var0
+        quadratic = -0.5 * (1.0 / var1 - 1.0 / var0)
+        intercept = const[1] - const[0] - 0.5 * np.sum(theta1 ** 2 / var1 - theta0 ** 2 / var0)
+        return linear, quadratic, float(intercept)
+
+    if name == 'LogisticRegression':
+        linear = model.coef_[0].astype(np.float64)
+        return linear, np.zeros_like(linear), float(model.intercept_[0])
+
+    return None
+
+
+def decision_scorer(model):
+    """(score, cutoff) with score(X) > cutoff the stroke decision: NumPy log odds
+    when log_odds_params applies, else predict_proba probabilities."""
+    params = log_odds_params(model)
+    if params is not None:
+        linear, quadratic, intercept = params
+
+        def log_odds(X):
+            # Horner form sum_j (quadratic_j * x_j + linear_j) * x_j, reduced by einsum
+            terms = X * quadratic
+            terms += linear
+            z = np.einsum('ij,ij->i', terms, X)
+            z += intercept
+            return z
+        return log_odds, THRESHOLD_LOGIT
+
+    def proba(X):
+        # sklearn config is per thread, so set it where the model runs
+        with sklearn.config_context(assume_finite=True):
+            return model.predict_proba(X)[:, 1]
+    return proba, THRESHOLD
+
 
-app = FastAPI()
+score, CUTOFF = decision_scorer(model)
+
+# Largest number of queued requests scored with one model call
+MAX_BATCH_SIZE = 64
+# Largest number of events accepted by /predict_batch
+MAX_BATCH_EVENTS = 4096
+
+
+async def batch_worker(queue: asyncio.Queue):
+    """Score whatever requests are queued (up to MAX_BATCH_SIZE) with one model call,
+    reusing one input buffer since each batch is scored before the next is filled."""
+    loop = asyncio.get_running_loop()
+    buffer = np.empty((MAX_BATCH_SIZE, len(FEATURE_ORDER)), dtype=np.float64)
+    while True:
+        items = [await queue.get()]
+        while len(items) < MAX_BATCH_SIZE:
+            try:
+                items.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        X = buffer[:len(items)]
+        X[:] = [features for features, _ in items]
+        try:
+            scores = await loop.run_in_executor(None, score, X)
+        except Exception as exc:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(exc)
+            continue
+
+        for (_, future), value in zip(items, scores):
+            if not future.done():
+                future.set_result(float(value))
+
+
+def touch_arrays(obj, seen=None) -> None:
+    """Read every NumPy array reachable from obj so its pages are resident."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        if obj.dtype != object:
+            obj.sum()
+            return
+        children = obj.ravel()
+    elif isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    elif hasattr(obj, '__dict__'):
+        children = vars(obj).values()
+    else:
+        return
+
+    for child in children:
+        touch_arrays(child, seen)
+
+
+def warm_up() -> None:
+    """Fault the model into memory and run a few predictions so the first
+    request does not pay for page faults and lazy imports."""
+    touch_arrays(model)
+    for _ in range(3):
+        score(np.zeros((1, len(FEATURE_ORDER)), dtype=np.float64))
+    check_parity()
+
+
+# Value ranges of the continuous features for the parity check, binary features are 0/1.
+# The model and the API take the training scale from Model.ipynb: Age/100,
+# Avg_glucose_level/300 and Bmi/100, so these are rescaled adult ranges.
+PARITY_RANGES = {"Age": (0.18, 1.0), "Avg_glucose_level": (0.15, 0.9), "Bmi": (0.1, 0.7)}
+
+
+def check_parity(n_rows: int = 5000) -> None:
+    """Fail startup if the NumPy log odds decide differently from predict_proba."""
+    if CUTOFF != THRESHOLD_LOGIT:
+        return
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.uniform(*PARITY_RANGES[name], n_rows) if name in PARITY_RANGES
+                         else rng.integers(0, 2, n_rows) for name in FEATURE_ORDER])
+    mismatches = np.count_nonzero(
+        (score(X) > CUTOFF) != (model.predict_proba(X)[:, 1] > THRESHOLD))
+    if mismatches:
+        raise RuntimeError(f"log_odds_params disagrees with predict_proba on "
+                           f"{mismatches} of {n_rows} rows")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up()
+    app.state.queue = asyncio.Queue()
+    worker = asyncio.create_task(batch_worker(app.state.queue))
+    yield
+    worker.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Home page
 @app.get("/")
@@ -41,13 +261,56 @@ def home():
 
 
 
-# Inference endpoint
-@app.post("/predict", response_model=PredictionOut)
-def predict(payload: Stroke_Event):
-    cust_df = pd.DataFrame([payload.model_dump()])
-    predictions = model.predict_proba(cust_df)[0, 1]
+# Inference endpoint (PredictionOut documents the body, it is not re-validated)
+@app.post("/predict", response_model=PredictionOut, openapi_extra={
+    "requestBody": {"required": True,
+                    "content": {"application/json": {"schema": EVENT_SCHEMA}}}})
+async def predict(request: Request):
+    try:
+        payload = event_decoder.decode(await request.body())
+    except msgspec.DecodeError as exc:
+        raise validation_error(exc)
+
+    # The batch worker copies the row into its input buffer
+    features = astuple(payload)
+    if not np.isfinite(features).all():
+        raise non_finite_error(features)
+
+    # Hand the row to the batch worker and wait for its score
+    future = asyncio.get_running_loop().create_future()
+    await app.state.queue.put((features, future))
+    value = await future
+
+    return Response(prediction_body(int(value > CUTOFF)),
+                    media_type="application/json")
+
+
+# Batch inference endpoint
+@app.post("/predict_batch", response_model=PredictionBatchOut, openapi_extra={
+    "requestBody": {"required": True,
+                    "content": {"application/json": {
+                        "schema": {"type": "array", "items": EVENT_SCHEMA}}}}})
+async def predict_batch(request: Request):
+    """Score a list of events with one model call.
+    Batches of about 64-256 events amortize the per-call overhead best."""
+    try:
+        events = batch_decoder.decode(await request.body())
+    except msgspec.DecodeError as exc:
+        raise validation_error(exc)
+
+    if not events:
+        return Response(b'{"default_proba":[]}', media_type="application/json")
+    if len(events) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {MAX_BATCH_EVENTS} events per batch")
+
+    X = np.empty((len(events), len(FEATURE_ORDER)), dtype=np.float64)
+    X[:] = [astuple(event) for event in events]
+    if not np.isfinite(X).all():
+        raise non_finite_error(X)
 
-    adjusted_predictions = (predictions > 0.545455).astype(int)
+    scores = await asyncio.get_running_loop().run_in_executor(None, score, X)
+    flags = (scores > CUTOFF).astype(np.uint8).tolist()
 
-    result = {"default_proba": adjusted_predictions}
-    return result
\ No newline at end of file
+    return Response(msgspec.json.encode({"default_proba": flags}),
+                    media_type="application/json")
@@ -0,0 +1,33 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from main import FEATURE_ORDER, app
+
+EVENT = {name: 0 for name in FEATURE_ORDER} | {
+    "Age": 0.67, "Avg_glucose_level": 0.76, "Bmi": 0.366}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf"])
+@pytest.mark.parametrize("field", ["Age", "Avg_glucose_level", "Bmi"])
+def test_predict_rejects_non_finite(client, field, value):
+    response = client.post("/predict", json=EVENT | {field: value})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", field]
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf"])
+def test_predict_batch_rejects_non_finite(client, value):
+    response = client.post("/predict_batch", json=[EVENT, EVENT | {"Bmi": value}])
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", 1, "Bmi"]
+
+
+def test_finite_events_are_scored(client):
+    assert client.post("/predict", json=EVENT).json()["default_proba"] in (0, 1)
+    assert len(client.post("/predict_batch", json=[EVENT] * 3).json()["default_proba"]) == 3